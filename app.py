@@ -6,7 +6,7 @@ from scripts.analysis import Analyst
 
 # Initialize analyst instance
 routes = Case['routes']
-analyst = Analyst(routes)
+analyst = Analyst(routes, time_period=Case['time_period'])
 
 # Countries
 chl = analyst.extract_country_data('CHL','Chile')
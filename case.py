@@ -4,7 +4,8 @@ Case = {
         'inflation': './data/inflation.csv',
         'debt': './data/debt.csv',
         'gdp_growth': './data/gdp_growth.csv'
-    }
+    },
+    'time_period': (1960, 2020)
 }
 
 ##### INDICATORS #####
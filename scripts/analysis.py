@@ -1,3 +1,6 @@
+import os
+import weakref
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,75 +9,227 @@ from sklearn.linear_model import LinearRegression
 from scipy.stats import pearsonr, linregress
 
 from scripts.country import Country
+from scripts.profiling import stage, traced
 
 class Analyst:
 
-    def __init__(self,routes):
-        self.routes = routes
+    # How each per-country source is laid out: the column identifying the country,
+    # whether that column holds the ISO code or the country name, and the indicator
+    # name the source's row gets in the country data. Sources not listed here are
+    # expected to look like inflation.csv/debt.csv (first column = country name).
+    source_layouts = {
+        'inflation': ('Inflation rate, average consumer prices (Annual percent change)', 'name',
+                      'Inflation rate, average consumer prices (Annual percent change)'),
+        'debt': ('DEBT (% of GDP)', 'name', 'DEBT (% of GDP)'),
+        'gdp_growth': ('Country Code', 'iso', 'GDP growth (annual %)'),
+    }
+    source_attributes = {'inflation': 'inflation', 'debt': 'debt', 'gdp_growth': 'growth'}
+
+    def __init__(self, routes, time_period=(1960, 2020)):
+        self.routes = dict(routes)
+        self.time_period = tuple(time_period)
+        self.non_year_columns = ['Economy ISO3', 'Economy Name', 'Indicator ID', 'Indicator']
+        # only live countries are tracked, so throwaway extracts are not refreshed
+        self.countries = weakref.WeakSet()
         self.load_data()
 
+    @traced()
     def load_data(self):
         #read routes
-        self.qog_db = pd.read_csv(self.routes['qog_db'])
-        self.inflation = pd.read_csv(self.routes['inflation'])
-        self.debt = pd.read_csv(self.routes['debt'])
-        self.growth = pd.read_csv(self.routes['gdp_growth'])
+        self.data_sources = {}
+        self.source_signatures = {}
+        with stage('read_csv'):
+            for source in self.routes:
+                self.source_signatures[source] = self.read_source(source)
         ###
-        self.time_period = (1960,2020)
-        self.non_year_columns = ['Economy ISO3', 'Economy Name', 'Indicator ID', 'Indicator']
+        self.year_columns = []
+        self.set_time_period(self.time_period)
+
+    def read_source(self, source):
+        """
+        Read a single source from its route and return the file signature it was read at.
+        """
+        route = self.routes[source]
+        signature = self.source_signature(route)
+        self.data_sources[source] = pd.read_csv(route)
+        if source in self.source_attributes:
+            setattr(self, self.source_attributes[source], self.data_sources[source])
+        return signature
+
+    def source_signature(self, route):
+        stat = os.stat(route)
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed_sources(self):
+        """
+        Return the sources whose file changed (or that were added) since they were last read.
+        """
+        return [source for source, route in self.routes.items()
+                if self.source_signatures.get(source) != self.source_signature(route)]
+
+    def indicator_sources(self):
+        return [source for source in self.routes if source != 'qog_db']
+
+    def source_layout(self, source):
+        if source in self.source_layouts:
+            return self.source_layouts[source]
+        key_column = self.data_sources[source].columns[0]
+        return key_column, 'name', key_column
+
+    def set_time_period(self, time_period):
+        """
+        Set the year axis used for every country and return the years that were added to it.
+        """
+        previous_years = set(self.year_columns)
+        self.time_period = tuple(time_period)
         self.year_columns = [str(year) for year in range(self.time_period[0], self.time_period[1] + 1)]
         self.columns_to_keep = self.non_year_columns + self.year_columns
-        self.qog_db = self.qog_db[self.columns_to_keep]
+        self.select_qog_columns()
+        return [year for year in self.year_columns if year not in previous_years]
 
-    def extract_gdp_growth_data(self, code):
-        country_data = self.growth[self.growth['Country Code']==code]
-        country_data = country_data[[str(year) for year in range(1960, 2020 + 1)]]
+    def select_qog_columns(self):
+        self.qog_db = self.data_sources['qog_db'].reindex(columns=self.columns_to_keep)
+
+    @traced()
+    def extract_source_data(self, source, iso_code, name):
+        """
+        Extract a country's row from a per-country source, aligned to the year axis.
+
+        Parameters:
+        - source: The route key of the source (e.g., 'inflation').
+        - iso_code: The country's ISO3 code.
+        - name: The country's name.
+
+        Returns:
+        - A Series indexed by year and the name of the indicator it holds.
+        """
+        key_column, key_type, indicator = self.source_layout(source)
+        source_data = self.data_sources[source]
+        country_data = source_data[source_data[key_column] == (iso_code if key_type == 'iso' else name)]
+        years = [year for year in self.year_columns if year in source_data.columns]
+        country_data = country_data[years]
+        with stage('clean_cells'):
+            country_data = country_data.map(lambda x: str(x).replace('no data', str(np.nan)) if isinstance(x, str) else x)
+            country_data = country_data.map(lambda x: float(str(x).replace(',', '.')) if isinstance(x, str) else x)
         new_row = pd.Series(np.nan, index=self.year_columns)
-        new_row.loc['1960':'2020'] = country_data.values[0]
-        return new_row, 'GDP growth (annual %)'
+        # a country missing from the source gets an all-NaN row
+        if not country_data.empty:
+            new_row.loc[years] = country_data.values[0]
+        return new_row, indicator
+
+    def extract_gdp_growth_data(self, code):
+        return self.extract_source_data('gdp_growth', code, None)
 
     def extract_inflation_data(self, name):
-        country_data = self.inflation[self.inflation['Inflation rate, average consumer prices (Annual percent change)']==name]
-        country_data = country_data[[str(year) for year in range(1980, 2020 + 1)]]
-        country_data = country_data.map(lambda x: str(x).replace('no data', str(np.nan)) if isinstance(x, str) else x)
-        country_data = country_data.map(lambda x: float(str(x).replace(',', '.')) if isinstance(x, str) else x)
-        new_row = pd.Series(np.nan, index=self.year_columns)
-        new_row.loc['1980':'2020'] = country_data.values[0]
-        return new_row, 'Inflation rate, average consumer prices (Annual percent change)'
+        return self.extract_source_data('inflation', None, name)
     
     def extract_debt_data(self, name):
-        country_data = self.debt[self.debt['DEBT (% of GDP)']==name]
-        country_data = country_data[[str(year) for year in range(1960, 2015 + 1)]]
-        country_data = country_data.map(lambda x: str(x).replace('no data', str(np.nan)) if isinstance(x, str) else x)
-        country_data = country_data.map(lambda x: float(str(x).replace(',', '.')) if isinstance(x, str) else x)
-        new_row = pd.Series(np.nan, index=self.year_columns)
-        new_row.loc['1960':'2015'] = country_data.values[0]
-        return new_row, 'DEBT (% of GDP)'
+        return self.extract_source_data('debt', None, name)
 
-    def extract_country_data(self, iso_code, name):
+    @traced()
+    def extract_qog_data(self, iso_code):
         # Filter the DataFrame based on the 'Economy ISO3' column
         country_data = self.qog_db[self.qog_db['Economy ISO3'] == iso_code].set_index('Indicator')
         country_data = country_data.drop(self.columns_to_keep[:3], axis=1)
-        country_data = country_data.map(lambda x: float(str(x).replace(',', '.')) if isinstance(x, str) else x)
-        #calculate country inflation
-        inflation_data, inflation_name = self.extract_inflation_data(name)
-        country_data.loc[inflation_name] = inflation_data
-        #calculate country debt
-        debt_data, debt_name = self.extract_debt_data(name)
-        country_data.loc[debt_name] = debt_data
-        #calculate country gdp growth
-        growth_data, growth_name = self.extract_gdp_growth_data(iso_code)
-        country_data.loc[growth_name] = growth_data
+        with stage('clean_cells'):
+            country_data = country_data.map(lambda x: float(str(x).replace(',', '.')) if isinstance(x, str) else x)
+        return country_data
+
+    @traced()
+    def extract_country_data(self, iso_code, name):
+        country_data = self.extract_qog_data(iso_code)
+        #calculate country inflation, debt, gdp growth and any other per-country source
+        for source in self.indicator_sources():
+            source_data, source_name = self.extract_source_data(source, iso_code, name)
+            country_data.loc[source_name] = source_data
         #prepare the country data
         token = Country({'ISO': iso_code, 'data': country_data, 'name': name})
+        # keep track of the country so refresh() can update it in place
+        self.countries.add(token)
         return token
+
+    def update_country_data(self, country, sources):
+        """
+        Align `country` to the year axis and re-extract the rows coming from `sources`,
+        keeping every other row.
+        """
+        country_data = country.data.reindex(columns=self.year_columns)
+        previous_data = country_data
+        if 'qog_db' in sources:
+            # rebuild like extract_country_data: source rows are written over the QoG extract
+            country_data = self.extract_qog_data(country.ISO)
+        for source in self.indicator_sources():
+            if source in sources:
+                source_data, source_name = self.extract_source_data(source, country.ISO, country.name)
+            elif 'qog_db' in sources and self.source_layout(source)[2] in previous_data.index:
+                source_name = self.source_layout(source)[2]
+                source_data = previous_data.loc[source_name]
+            else:
+                continue
+            country_data.loc[source_name] = source_data
+        country.data = country_data
+
+    @traced()
+    def refresh(self, routes=None, time_period=None, regions=None):
+        """
+        Bring the loaded data and every country built by this analyst up to date with new
+        data vintages, re-reading only the sources whose files changed.
+
+        Parameters:
+        - routes: Optional dictionary of new or moved sources (e.g., {'trade': './data/trade.csv'}).
+        - time_period: Optional (start, end) the year axis should be extended to cover
+                       (e.g., (1960, 2023)). The axis only grows; sources such as
+                       inflation.csv carry projections, so it is never extended implicitly.
+        - regions: Optional list of extra Region instances to recompute. Regions built from
+                   countries this analyst extracted are found automatically; any other
+                   region keeps its old data unless it is listed here.
+
+        Returns:
+        - The list of sources that were re-extracted.
+        """
+        if routes:
+            self.routes.update(routes)
+        changed = self.changed_sources()
+        signatures = {}
+        with stage('read_csv'):
+            for source in changed:
+                signatures[source] = self.read_source(source)
+
+        previous_period = self.time_period
+        try:
+            new_years = []
+            if time_period:
+                new_years = self.set_time_period((min(self.time_period[0], time_period[0]),
+                                                  max(self.time_period[1], time_period[1])))
+            elif 'qog_db' in changed:
+                self.select_qog_columns()
+
+            # Unchanged sources only need re-extracting if they have data for the added years
+            stale = [source for source in self.routes
+                     if source in changed or any(year in self.data_sources[source].columns for year in new_years)]
+            if stale or new_years:
+                affected_regions = {id(region): region for region in regions or []}
+                for country in list(self.countries):
+                    self.update_country_data(country, stale)
+                    affected_regions.update((id(region), region) for region in country.regions)
+                for region in affected_regions.values():
+                    region.refresh()
+        except Exception:
+            # The new signatures are not recorded and the axis is restored, so the next
+            # refresh() redoes this update for every country
+            self.set_time_period(previous_period)
+            raise
+
+        self.source_signatures.update(signatures)
+        return stale
     
+    @traced()
     def plot_time_series(self, countries, indicator, period=False, periods=None, periods_titles=None):
         plt.figure(figsize=(10, 6))
 
         # Set the default period if not provided
         if not period:
-            period = (1960, 2020)
+            period = self.time_period
 
         # Define a list of pastel colors for shading the periods
         pastel_colors = ['#ffb3ba', '#baffc9', '#bae1ff', '#ffffba', '#ffdfba', '#ffb3ff']
@@ -114,12 +269,15 @@ class Analyst:
         # Add a legend
         plt.legend(loc='best', fontsize=10)
 
-        # Adjust the layout
-        plt.tight_layout()
+        with stage('render'):
+            # Adjust the layout
+            plt.tight_layout()
+            plt.gcf().canvas.draw()
 
         # Display the plot
         plt.show()
 
+    @traced()
     def calculate_period_stats(self, countries, indicator, periods=None, periods_titles=None, filename=None):
         """
         Calculate detailed statistics, including linear trend, volatility (standard deviation),
@@ -144,9 +302,9 @@ class Analyst:
         stats_list = []
         graph_data = {'indicator': indicator, 'periods': [], 'countries': {}, 'average': {}}
 
-        # Historical full period (1960-2020)
-        historical_period = (1960, 2020)
-        historical_period_name = "Historical (1960-2020)"
+        # Historical full period (the analyst's whole year axis)
+        historical_period = self.time_period
+        historical_period_name = f"Historical ({historical_period[0]}-{historical_period[1]})"
 
         # Iterate over each country
         for country in countries:
@@ -170,7 +328,8 @@ class Analyst:
                 
                 # Perform linear regression to get the trend (slope)
                 if len(time_series) > 1:  # Ensure there are enough data points
-                    model = LinearRegression().fit(years.reshape(-1, 1), time_series.values)
+                    with stage('fit_trend'):
+                        model = LinearRegression().fit(years.reshape(-1, 1), time_series.values)
                     trend = model.coef_[0]  # Slope of the trend
                 else:
                     trend = np.nan  # No trend if insufficient data
@@ -198,12 +357,13 @@ class Analyst:
             # Store country's data for graphing
             graph_data['countries'][country.name] = country_trend
 
-            # Historical statistics (1960-2020) for the full time period
+            # Historical statistics for the full time period
             historical_time_series = country.data.loc[indicator, str(historical_period[0]):str(historical_period[1])].dropna()  # Drop NaNs
             historical_years = np.array(historical_time_series.index.astype(int))
 
             if len(historical_time_series) > 1:
-                historical_model = LinearRegression().fit(historical_years.reshape(-1, 1), historical_time_series.values)
+                with stage('fit_trend'):
+                    historical_model = LinearRegression().fit(historical_years.reshape(-1, 1), historical_time_series.values)
                 historical_trend = historical_model.coef_[0]
             else:
                 historical_trend = np.nan
@@ -265,6 +425,7 @@ class Analyst:
         # Return the DataFrame and graph data for visualization
         return final_stats_df, graph_data
     
+    @traced()
     def plot_trend_comparison(self, table, graph_data):
         """
         Plot the comparison of linear trends for multiple countries with shaded volatility and period markers.
@@ -302,7 +463,8 @@ class Analyst:
                 # Perform linear regression to get the trend line across the period
                 X = years.reshape(-1, 1)
                 if len(values) > 1:
-                    model = LinearRegression().fit(X, values)
+                    with stage('fit_trend'):
+                        model = LinearRegression().fit(X, values)
                     trend_values = model.predict(X)  # Predicted values (trend line)
                     trend_coefficient = model.coef_[0]
 
@@ -348,9 +510,12 @@ class Analyst:
         plt.legend(loc='best', fontsize=10)
 
         # Display the plot
-        plt.tight_layout()
+        with stage('render'):
+            plt.tight_layout()
+            plt.gcf().canvas.draw()
         plt.show()
 
+    @traced()
     def indicator_relationship_stats(self, country, indicator_x, indicator_y, plot=True):
         """
         Return a table with important statistical values for the relationship between two indicators,
@@ -384,7 +549,8 @@ class Analyst:
             return None
 
         # Calculate linear regression statistics
-        slope, intercept, r_value, p_value, std_err = linregress(x_values, y_values)
+        with stage('fit_trend'):
+            slope, intercept, r_value, p_value, std_err = linregress(x_values, y_values)
         r_squared = r_value ** 2
         
         # Calculate Pearson correlation
@@ -434,7 +600,9 @@ class Analyst:
             plt.grid(True, linestyle='--', alpha=0.7)
 
             # Display the plot
-            plt.tight_layout()
+            with stage('render'):
+                plt.tight_layout()
+                plt.gcf().canvas.draw()
             plt.show()
         
         return stats_df
\ No newline at end of file
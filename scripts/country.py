@@ -1,12 +1,18 @@
+import weakref
+
 import pandas as pd
 import numpy as np
 
+from scripts.profiling import traced
+
 class Country:
 
     def __init__(self, inputs):
         self.ISO = inputs['ISO']
         self.name = inputs['name']
         self.data = inputs['data']
+        # regions built from this country, recomputed when Analyst.refresh updates it
+        self.regions = weakref.WeakSet()
 
 class Region:
     def __init__(self, countries, name="Region", weight='average'):
@@ -22,10 +28,21 @@ class Region:
         self.countries = countries
         self.weight = weight
         self.name = f"{name} ({weight})"
+        for country in countries:
+            country.regions.add(self)
 
         # Compute the region data based on the weight
         self.data = self.compute_region_data()
 
+    def refresh(self):
+        """
+        Recompute the region's data after its countries' data has been updated
+        (e.g., by Analyst.refresh).
+        """
+        self.data = self.compute_region_data()
+        return self.data
+
+    @traced()
     def compute_region_data(self):
         """
         Compute the region's aggregated data based on the given weight.
@@ -49,6 +66,7 @@ class Region:
                                            for i, (idx, is_dup) in enumerate(zip(country_data.index, country_data.index.duplicated(keep=False)))])
         return country_data
 
+    @traced()
     def average_indicators(self):
         """
         Calculate the average of each indicator across all countries (ignoring missing values).
@@ -68,6 +86,7 @@ class Region:
 
         return averaged_data
 
+    @traced()
     def weighted_indicators(self):
         """
         Calculate the weighted average of each indicator across all countries based on the given indicator.
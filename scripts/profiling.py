@@ -0,0 +1,296 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Shared no-op context returned by stage() when tracing is off, so the
+# instrumented code paths pay only an attribute lookup and a branch.
+_NULL_STAGE = nullcontext()
+
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """
+        Clear every recorded stage, stack and profile.
+        """
+        self.stages = {}
+        self.stacks = {}
+        self.profiles = {}
+        self.profile_targets = set()
+        self.profile_skipped = set()
+        self._frames = []
+        self._active_profile = None
+        self._depth = 0
+        self._memory = False
+        self._owns_tracemalloc = False
+        self._started_at = None
+        self._start_time = None
+        self._total_time = 0.0
+
+    def start(self, profile=None, memory=True):
+        """
+        Start recording per-stage timings (and memory).
+
+        Calls nest: starting an already running tracer adds its profile targets to the
+        current run, and only the matching outermost stop() ends it.
+
+        Parameters:
+        - profile: Optional stage name (or list of names) to capture with cProfile,
+                   e.g. 'calculate_period_stats'. Only one profiler can run at a time, so
+                   a target running inside another target is not captured; it is listed
+                   under 'profile_skipped' in the report instead.
+        - memory: Whether to track peak memory with tracemalloc. tracemalloc slows
+                  allocation-heavy code down, so disable it for pure timing runs.
+        """
+        if isinstance(profile, str):
+            profile = [profile]
+        targets = {name.strip() for name in (profile or []) if name and name.strip()}
+        self._depth += 1
+        if self.enabled:
+            self.profile_targets |= targets
+            return
+        self.reset()
+        self._depth = 1
+        self.profile_targets = targets
+        self._memory = memory
+        self._owns_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        self._started_at = datetime.now().isoformat(timespec='seconds')
+        self._start_time = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        """
+        Stop recording. Collected data stays available for report() and export().
+
+        Returns:
+        - True if this call ended the run, False if an outer start() still holds it.
+        """
+        if not self.enabled:
+            return False
+        self._depth -= 1
+        if self._depth > 0:
+            return False
+        self.enabled = False
+        self._total_time = time.perf_counter() - self._start_time
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        return True
+
+    def force_stop(self):
+        """
+        End the run regardless of how many start() calls are still open.
+        """
+        if self.enabled:
+            self._depth = 1
+        return self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    @contextmanager
+    def session(self, report=None, profile=None, memory=True):
+        """
+        Trace everything executed inside the block and optionally export the report.
+
+        Inside an already running trace the block just joins it; the report is then
+        written by whoever started the run.
+
+        Parameters:
+        - report: Optional path of the JSON report written when the block exits.
+        - profile: Optional stage name (or list of names) to capture with cProfile.
+        - memory: Whether to track peak memory with tracemalloc.
+        """
+        self.start(profile=profile, memory=memory)
+        try:
+            yield self
+        finally:
+            if self.stop() and report:
+                self.export(report)
+
+    def stage(self, name):
+        """
+        Return a context manager timing the enclosed block as the stage `name`.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._record(name)
+
+    @contextmanager
+    def _record(self, name):
+        current = 0
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._frames:
+                parent = self._frames[-1]
+                parent['peak'] = max(parent['peak'], peak)
+            tracemalloc.reset_peak()
+        frame = {'name': name, 'memory': current, 'peak': current}
+        self._frames.append(frame)
+
+        profiler = None
+        if name in self.profile_targets:
+            if self._active_profile is None:
+                profiler = self.profiles.get(name)
+                if profiler is None:
+                    profiler = self.profiles[name] = cProfile.Profile()
+                self._active_profile = profiler
+                profiler.enable()
+            elif name not in self.profile_skipped:
+                self.profile_skipped.add(name)
+                warnings.warn(f"Stage '{name}' runs inside another profiled stage and is not profiled separately.")
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._active_profile = None
+
+            if self._memory:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            stack = ';'.join(f['name'] for f in self._frames)
+            self._frames.pop()
+            if self._memory:
+                if self._frames:
+                    parent = self._frames[-1]
+                    parent['peak'] = max(parent['peak'], frame['peak'])
+                tracemalloc.reset_peak()
+
+            entry = self.stages.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'peak_memory': 0})
+            entry['calls'] += 1
+            entry['wall_time'] += elapsed
+            entry['peak_memory'] = max(entry['peak_memory'], frame['peak'] - frame['memory'])
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed
+
+    def report(self):
+        """
+        Build a dictionary summarising the run.
+
+        Returns:
+        - A dictionary with the total run time, per-stage wall time, call counts and
+        peak memory (bytes allocated above the stage's starting point, None when memory
+        tracking is off), and the cumulative time of every nested stage stack.
+        """
+        total_time = self._total_time
+        if self.enabled:
+            total_time = time.perf_counter() - self._start_time
+        stages = {}
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]['wall_time']):
+            stages[name] = {
+                'calls': entry['calls'],
+                'wall_time': entry['wall_time'],
+                'mean_time': entry['wall_time'] / entry['calls'],
+                'peak_memory': entry['peak_memory'] if self._memory else None,
+            }
+        return {
+            'started_at': self._started_at,
+            'memory_tracked': self._memory,
+            'total_time': total_time,
+            'stages': stages,
+            'stacks': dict(self.stacks),
+            'profiled': sorted(self.profiles),
+            'profile_skipped': sorted(self.profile_skipped),
+        }
+
+    def folded_stacks(self):
+        """
+        Return the stage stacks in the folded format read by flamegraph.pl and speedscope.
+
+        Each line is 'outer;inner <microseconds>', where the count is the time spent in
+        the stack itself (children excluded).
+        """
+        self_time = dict(self.stacks)
+        for stack, elapsed in self.stacks.items():
+            if ';' in stack:
+                parent = stack.rsplit(';', 1)[0]
+                self_time[parent] = self_time.get(parent, 0.0) - elapsed
+        return '\n'.join(f"{stack} {max(int(elapsed * 1e6), 0)}" for stack, elapsed in self_time.items())
+
+    def export(self, filename):
+        """
+        Write the run report to disk.
+
+        Parameters:
+        - filename: Path of the JSON report. A '.folded' flamegraph file and one
+                    '.<stage>.prof' cProfile dump per profiled stage are written next to it.
+
+        Returns:
+        - The report dictionary.
+        """
+        report = self.report()
+        base = os.path.splitext(filename)[0]
+        report['profiles'] = {}
+        for name, profiler in self.profiles.items():
+            profile_file = f"{base}.{name}.prof"
+            profiler.dump_stats(profile_file)
+            report['profiles'][name] = profile_file
+        report['folded'] = f"{base}.folded"
+        with open(report['folded'], 'w') as file:
+            file.write(self.folded_stacks() + '\n')
+        with open(filename, 'w') as file:
+            json.dump(report, file, indent=2)
+        return report
+
+
+tracer = Tracer()
+
+
+def stage(name):
+    """
+    Time the enclosed block as the stage `name` on the shared tracer.
+    """
+    return tracer.stage(name)
+
+
+def traced(name=None):
+    """
+    Decorator recording every call of the wrapped function as a stage.
+
+    Parameters:
+    - name: Optional stage name (defaults to the function name).
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _stop_and_export(filename):
+    # Close the environment-started run even if a session() was left open
+    tracer.force_stop()
+    tracer.export(filename)
+
+
+# Opt-in through the environment, e.g.
+#   CASE_PROFILE=1 CASE_PROFILE_METHODS=calculate_period_stats CASE_PROFILE_MEMORY=0 python app.py
+if os.environ.get('CASE_PROFILE', '') not in ('', '0'):
+    tracer.start(profile=os.environ.get('CASE_PROFILE_METHODS', '').split(','),
+                 memory=os.environ.get('CASE_PROFILE_MEMORY', '1') not in ('', '0'))
+    atexit.register(_stop_and_export, os.environ.get('CASE_PROFILE_OUTPUT', 'profile_report.json'))
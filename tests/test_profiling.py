@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+from scripts import profiling
+from scripts.profiling import Tracer
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    # route stage() and @traced through a fresh tracer
+    tracer = Tracer()
+    monkeypatch.setattr(profiling, 'tracer', tracer)
+    return tracer
+
+
+@profiling.traced()
+def outer():
+    with profiling.stage('inner'):
+        time.sleep(0.002)
+        data = [0] * 100000
+    time.sleep(0.001)
+    return len(data)
+
+
+@profiling.traced()
+def nested_target():
+    return outer()
+
+
+def test_disabled_tracer_records_nothing(tracer):
+    assert outer() == 100000
+    assert profiling.stage('inner') is profiling._NULL_STAGE
+    assert tracer.stages == {} and tracer.stacks == {}
+
+
+def test_nested_session_exports_only_at_outermost_level(tracer, tmp_path):
+    outer_report = tmp_path / 'outer.json'
+    inner_report = tmp_path / 'inner.json'
+    with tracer.session(report=str(outer_report)):
+        outer()
+        with tracer.session(report=str(inner_report), profile='outer'):
+            outer()
+        assert tracer.enabled
+        outer()
+    assert not tracer.enabled
+    assert not inner_report.exists()
+
+    report = json.loads(outer_report.read_text())
+    assert report['stages']['outer']['calls'] == 3
+    assert report['stages']['inner']['calls'] == 3
+    assert report['profiled'] == ['outer']
+    assert (tmp_path / 'outer.outer.prof').exists()
+    assert (tmp_path / 'outer.folded').exists()
+
+
+def test_folded_self_times_add_up_to_stack_totals(tracer):
+    with tracer.session():
+        nested_target()
+        outer()
+    folded = {}
+    for line in tracer.folded_stacks().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        folded[stack] = int(count)
+    assert set(folded) == {'nested_target', 'nested_target;outer', 'nested_target;outer;inner', 'outer', 'outer;inner'}
+    for root in ('nested_target', 'outer'):
+        self_times = sum(count for stack, count in folded.items() if stack == root or stack.startswith(root + ';'))
+        # each line is truncated to whole microseconds
+        assert self_times == pytest.approx(tracer.stacks[root] * 1e6, abs=len(folded))
+
+
+def test_peak_memory_rolls_up_to_parent(tracer):
+    with tracer.session():
+        outer()
+    stages = tracer.report()['stages']
+    assert stages['inner']['peak_memory'] >= 100000 * 8
+    assert stages['outer']['peak_memory'] >= stages['inner']['peak_memory']
+
+
+def test_memory_off_reports_no_peak(tracer):
+    with tracer.session(memory=False):
+        outer()
+    report = tracer.report()
+    assert report['memory_tracked'] is False
+    assert all(stage['peak_memory'] is None for stage in report['stages'].values())
+
+
+def test_nested_profile_target_is_reported_as_skipped(tracer):
+    with tracer.session(profile=['nested_target', 'outer']):
+        with pytest.warns(UserWarning, match="'outer'"):
+            nested_target()
+    report = tracer.report()
+    assert report['profiled'] == ['nested_target']
+    assert report['profile_skipped'] == ['outer']
+
+
+def test_force_stop_ends_nested_run(tracer):
+    tracer.start()
+    tracer.start()
+    assert tracer.force_stop()
+    assert not tracer.enabled
@@ -0,0 +1,172 @@
+import gc
+import os
+
+import pandas as pd
+import pytest
+
+from scripts.analysis import Analyst
+from scripts.country import Country, Region
+
+COUNTRIES = [('CHL', 'Chile'), ('ARG', 'Argentina')]
+
+
+def write_qog(path, years, indicators=('Real GDP (2005)', 'Trade (% of GDP)')):
+    rows = []
+    for iso, name in COUNTRIES:
+        for indicator in indicators:
+            row = {'Economy ISO3': iso, 'Economy Name': name, 'Indicator ID': indicator[:4], 'Indicator': indicator}
+            row.update({str(year): f"{year - 1990},5" for year in years})
+            rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def write_by_name(path, key_column, years, offset=0):
+    rows = []
+    for i, (iso, name) in enumerate(COUNTRIES):
+        row = {key_column: name}
+        row.update({str(year): 'no data' if year == years[0] else f"{i + year - 1990 + offset},25" for year in years})
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def write_growth(path, years, offset=0):
+    rows = []
+    for i, (iso, name) in enumerate(COUNTRIES):
+        row = {'Country Name': name, 'Country Code': iso,
+               'Indicator Name': 'GDP growth (annual %)', 'Indicator Code': 'NY.GDP.MKTP.KD.ZG'}
+        row.update({str(year): float(i + year - 1990 + offset) for year in years})
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+@pytest.fixture
+def routes(tmp_path):
+    routes = {
+        'qog_db': str(tmp_path / 'qog.csv'),
+        'inflation': str(tmp_path / 'inflation.csv'),
+        'debt': str(tmp_path / 'debt.csv'),
+        'gdp_growth': str(tmp_path / 'gdp_growth.csv'),
+    }
+    write_qog(routes['qog_db'], range(1995, 2006))
+    write_by_name(routes['inflation'], 'Inflation rate, average consumer prices (Annual percent change)', range(1998, 2010))
+    write_by_name(routes['debt'], 'DEBT (% of GDP)', range(1990, 2003))
+    write_growth(routes['gdp_growth'], range(1995, 2006))
+    return routes
+
+
+def touch(path):
+    # make sure the signature changes even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def rebuilt(routes, time_period):
+    analyst = Analyst(routes, time_period=time_period)
+    return {iso: analyst.extract_country_data(iso, name).data for iso, name in COUNTRIES}
+
+
+def test_extract_uses_source_years_within_axis(routes):
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    data = analyst.extract_country_data('CHL', 'Chile').data
+    assert list(data.columns) == [str(year) for year in range(1995, 2006)]
+    inflation = data.loc['Inflation rate, average consumer prices (Annual percent change)']
+    assert inflation[['1995', '1996', '1997', '1998']].isna().all()
+    assert inflation['1999'] == pytest.approx(9.25)
+    assert data.loc['DEBT (% of GDP)', '2003':].isna().all()
+    assert data.loc['GDP growth (annual %)', '2005'] == pytest.approx(15.0)
+    assert data.loc['Real GDP (2005)', '2000'] == pytest.approx(10.5)
+
+
+def test_refresh_rereads_only_changed_source(routes, monkeypatch):
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    countries = [analyst.extract_country_data(iso, name) for iso, name in COUNTRIES]
+    region = Region(countries, 'Test', weight='Real GDP (2005)')
+
+    write_growth(routes['gdp_growth'], range(1995, 2009), offset=100)
+    touch(routes['gdp_growth'])
+    read = []
+    original = Analyst.read_source
+    monkeypatch.setattr(Analyst, 'read_source', lambda self, source: read.append(source) or original(self, source))
+
+    stale = analyst.refresh(time_period=(1995, 2008))
+
+    assert read == ['gdp_growth']
+    assert analyst.time_period == (1995, 2008)
+    # inflation has data for the added years, so it is re-extracted without being re-read
+    assert stale == ['inflation', 'gdp_growth']
+    expected = rebuilt(routes, (1995, 2008))
+    for country in countries:
+        pd.testing.assert_frame_equal(country.data, expected[country.ISO])
+    # the region registered itself with its countries, so it is recomputed too
+    assert list(region.data.columns) == analyst.year_columns
+    assert analyst.refresh() == []
+
+
+def test_refresh_extends_axis_without_stale_sources(routes):
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    countries = [analyst.extract_country_data(iso, name) for iso, name in COUNTRIES]
+    region = Region(countries, 'Test', weight='Real GDP (2005)')
+
+    assert analyst.refresh(time_period=(1995, 2012), regions=[region]) == ['inflation']
+    # no source has data for 2013-2015, the countries and region still follow the axis
+    assert analyst.refresh(time_period=(1995, 2015), regions=[region]) == []
+    for country in countries:
+        assert list(country.data.columns) == analyst.year_columns
+    assert list(region.data.columns) == analyst.year_columns
+    # countries extracted before and after the refresh can be mixed in a region
+    newcomer = analyst.extract_country_data('ARG', 'Argentina')
+    Region([countries[0], newcomer], 'Test', weight='Real GDP (2005)')
+
+
+def test_refresh_new_source_and_retry_after_failure(routes, tmp_path):
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    chile = analyst.extract_country_data('CHL', 'Chile')
+    chile_again = analyst.extract_country_data('CHL', 'Chile')
+    argentina = analyst.extract_country_data('ARG', 'Argentina')
+
+    broken = tmp_path / 'trade.csv'
+    pd.DataFrame({'Country': ['Chile'], '2000': [1.0]}).to_csv(broken, index=False)
+    analyst.source_layouts = dict(Analyst.source_layouts, trade=('Missing', 'name', 'Trade'))
+    with pytest.raises(KeyError):
+        analyst.refresh(routes={'trade': str(broken)})
+    assert analyst.changed_sources() == ['trade']
+
+    analyst.source_layouts = Analyst.source_layouts
+    assert analyst.refresh() == ['trade']
+    for country in (chile, chile_again):
+        assert country.data.loc['Country', '2000'] == 1.0
+    # Argentina has no row in the new source
+    assert argentina.data.loc['Country'].isna().all()
+
+
+def test_refresh_qog_sharing_a_source_indicator(routes):
+    indicators = ('Real GDP (2005)', 'GDP growth (annual %)')
+    write_qog(routes['qog_db'], range(1995, 2006), indicators)
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    countries = [analyst.extract_country_data(iso, name) for iso, name in COUNTRIES]
+
+    write_qog(routes['qog_db'], range(1995, 2008), indicators)
+    touch(routes['qog_db'])
+    assert analyst.refresh() == ['qog_db']
+
+    expected = rebuilt(routes, (1995, 2005))
+    for country in countries:
+        assert country.data.index.is_unique
+        pd.testing.assert_frame_equal(country.data, expected[country.ISO])
+
+
+def test_refresh_updates_only_live_countries_and_given_regions(routes):
+    analyst = Analyst(routes, time_period=(1995, 2005))
+    chile = analyst.extract_country_data('CHL', 'Chile')
+    analyst.extract_country_data('ARG', 'Argentina')
+    gc.collect()
+    assert list(analyst.countries) == [chile]
+
+    # a region over countries the analyst did not build has to be passed in
+    outsider = Country({'ISO': 'ARG', 'name': 'Argentina', 'data': rebuilt(routes, (1995, 2005))['ARG']})
+    region = Region([outsider], 'Outsider', weight='Real GDP (2005)')
+    outsider.data.loc['Trade (% of GDP)'] = 0.0
+    analyst.refresh(time_period=(1995, 2006))
+    assert (region.data.loc['Trade (% of GDP)'] != 0).all()
+    analyst.refresh(time_period=(1995, 2007), regions=[region])
+    assert (region.data.loc['Trade (% of GDP)'] == 0).all()